@@ -4,10 +4,12 @@ import json
 import os
 from azure.data.tables import TableServiceClient, UpdateMode
 from datetime import datetime, timedelta
+from .sandbox import get_pool
 
 # Rate limiting configuration
 RATE_LIMIT = 10  # max requests
 WINDOW_SECONDS = 60 * 3 # per 3 minutes
+MAX_CODE_LENGTH = 5000  # max characters per submission
 
 def is_rate_limited(ip: str):
     conn_str = os.environ["DEPLOYMENT_STORAGE_CONNECTION_STRING"]
@@ -60,9 +62,9 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             headers=cors_headers
         )
     
-    logging.info('Code execution endpoint has been disabled.')
+    logging.info('Entered main() for ExecuteTwoSumSolutionProxy')
     
-    # Get IP for rate limiting (keeping this for consistency)
+    # Get IP for rate limiting
     ip = req.headers.get('X-Forwarded-For') or req.headers.get('X-Client-IP') or 'unknown'
     logging.info(f'Received request from IP: {ip}')
     
@@ -91,14 +93,71 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             headers=cors_headers
         )
     
-    # Return a message indicating that code execution is disabled
+    # Parse and validate the submission
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        logging.error("Failed to parse JSON body", exc_info=True)
+        return func.HttpResponse(
+            json.dumps({"error": "Please pass a valid JSON object in the request body"}),
+            mimetype="application/json",
+            status_code=400,
+            headers=cors_headers
+        )
+    code = req_body.get('code') if isinstance(req_body, dict) else None
+    if not isinstance(code, str) or not code.strip():
+        return func.HttpResponse(
+            json.dumps({"error": "Please pass 'code' in the request body"}),
+            mimetype="application/json",
+            status_code=400,
+            headers=cors_headers
+        )
+    if len(code) > MAX_CODE_LENGTH:
+        return func.HttpResponse(
+            json.dumps({"error": "Code is too long"}),
+            mimetype="application/json",
+            status_code=400,
+            headers=cors_headers
+        )
+    
+    # Run all test cases in one round trip to a pre-warmed sandbox worker
+    try:
+        outcome = get_pool().run(code)
+    except Exception:
+        logging.error("Error running solution in sandbox", exc_info=True)
+        return func.HttpResponse(
+            json.dumps({
+                "error": "Code execution is temporarily unavailable.",
+                "requests_remaining": requests_remaining,
+                "reset_seconds": reset_seconds
+            }),
+            mimetype="application/json",
+            status_code=503,
+            headers=cors_headers
+        )
+    if outcome.get("unavailable"):
+        # The worker could not isolate itself and refused to run the code
+        logging.error(outcome["error"])
+        return func.HttpResponse(
+            json.dumps({
+                "error": "Code execution is unavailable on this host.",
+                "requests_remaining": requests_remaining,
+                "reset_seconds": reset_seconds
+            }),
+            mimetype="application/json",
+            status_code=503,
+            headers=cors_headers
+        )
+    logging.info(f"Solution executed in {outcome['duration_ms']}ms (cached: {outcome['cached']})")
     return func.HttpResponse(
         json.dumps({
-            "error": "Code execution has been disabled. Please use the AI assistant for code help instead.",
+            "results": outcome["results"],
+            "all_passed": outcome["all_passed"],
+            "error": outcome["error"],
+            "stdout": outcome["stdout"],
             "requests_remaining": requests_remaining,
             "reset_seconds": reset_seconds
         }),
         mimetype="application/json",
-        status_code=503,
         headers=cors_headers
-    ) 
\ No newline at end of file
+    )
@@ -0,0 +1,568 @@
+import builtins
+import ctypes
+import hashlib
+import io
+import json
+import os
+import platform
+import resource
+import selectors
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import redirect_stdout
+
+# Sandbox configuration
+POOL_SIZE = int(os.environ.get("SANDBOX_POOL_SIZE", "4"))
+CPU_SECONDS = 2  # RLIMIT_CPU per submission
+MEMORY_BYTES = 256 * 1024 * 1024  # RLIMIT_AS per worker
+WALL_TIMEOUT_SECONDS = 5  # hard kill if a worker does not answer in time
+MAX_STDOUT_CHARS = 2000
+MAX_ERROR_CHARS = 500
+MAX_OUTPUT_LENGTH = 16  # indices a solution may return per test case
+MAX_JOB_BYTES = 64 * 1024
+MAX_RESULT_BYTES = 64 * 1024
+RESULT_CACHE_SIZE = 256
+NOBODY_ID = 65534
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 1
+MS_NOSUID = 2
+MS_NODEV = 4
+MS_NOEXEC = 8
+MS_REMOUNT = 32
+MS_REC = 16384
+MS_PRIVATE = 1 << 18
+MNT_DETACH = 2
+PR_SET_NO_NEW_PRIVS = 38
+SYS_PIVOT_ROOT = {"x86_64": 155, "aarch64": 41}
+CAPABILITY_VERSION_3 = 0x20080522
+SANDBOX_ROOT_MOUNTPOINT = b"/tmp"  # an empty tmpfs is mounted here and becomes the worker's root
+
+# Frames between the host and the helper: host -> helper (job id, length),
+# helper -> host (job id, kind, length); both followed by a JSON body
+JOB_HEADER = struct.Struct(">QI")
+REPLY_HEADER = struct.Struct(">QBI")
+RESULT_HEADER = struct.Struct(">I")
+KIND_RESULT = 0  # body is exactly what the worker sent after finishing normally
+KIND_ERROR = 1  # body was written by the helper: timeout, crash or oversized result
+
+# Only these environment variables reach the helper process
+HELPER_ENV_KEYS = ("PATH", "LANG", "LD_LIBRARY_PATH")
+
+# Hardcoded Two Sum test cases: (nums, target, expected indices)
+TWO_SUM_TEST_CASES = [
+    ([2, 7, 11, 15], 9, [0, 1]),
+    ([3, 2, 4], 6, [1, 2]),
+    ([3, 3], 6, [0, 1]),
+    ([1, 5, 3, 8, 2], 10, [3, 4]),
+    ([-3, 4, 3, 90], 0, [0, 2]),
+    ([0, 4, 3, 0], 0, [0, 3]),
+]
+
+# Modules a solution may import; loaded by the helper so workers start warm
+PRELOADED_MODULES = ["collections", "itertools", "functools", "heapq", "bisect", "math", "typing"]
+
+# Module references removed from a worker before it runs a submission
+DROPPED_MODULES = ("os", "posix", "subprocess", "socket", "_socket", "ctypes", "_ctypes", "selectors",
+                   "signal", "resource", "shutil", "io", "_io", "builtins", "importlib", "sys")
+
+# Builtins a submission does not get
+DROPPED_BUILTINS = ("open", "input", "breakpoint", "help", "exit", "quit")
+
+# The real isolation boundary is the worker process: an empty environment, no network,
+# an empty read-only root filesystem, no privileges and rlimits. Restricted imports and builtins only keep
+# honest mistakes out; they are not a sandbox.
+
+
+def _drop_to_nobody():
+    os.setgroups([])
+    os.setgid(NOBODY_ID)
+    os.setuid(NOBODY_ID)
+
+
+def _isolate():
+    # Private network and mount namespaces with an empty, read-only root filesystem, so the
+    # worker can reach neither the network nor any file or /proc entry. Returns False if any
+    # step is unavailable; the caller must then refuse to run code.
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        pivot_root = SYS_PIVOT_ROOT.get(platform.machine())
+        if pivot_root is None:
+            return False
+        flags = CLONE_NEWNS | CLONE_NEWNET
+        if libc.unshare(flags) != 0:
+            # No CAP_SYS_ADMIN (typical for containers, even as root): use a user namespace.
+            # Leave root first so the worker never holds the host's uid 0 inside it.
+            if os.geteuid() == 0:
+                _drop_to_nobody()
+            if libc.unshare(CLONE_NEWUSER | flags) != 0:
+                return False
+        if libc.mount(b"none", b"/", None, MS_REC | MS_PRIVATE, None) != 0:
+            return False
+        if libc.mount(b"tmpfs", SANDBOX_ROOT_MOUNTPOINT, b"tmpfs", MS_NOSUID | MS_NODEV | MS_NOEXEC, b"size=16k,mode=0755") != 0:
+            return False
+        # Swap the tmpfs in as / and detach the host filesystem from this mount namespace
+        os.chdir(SANDBOX_ROOT_MOUNTPOINT)
+        if libc.syscall(pivot_root, b".", b".") != 0:
+            return False
+        if libc.umount2(b".", MNT_DETACH) != 0:
+            return False
+        os.chdir("/")
+        if libc.mount(None, b"/", None, MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC, None) != 0:
+            return False
+        if os.geteuid() == 0:
+            _drop_to_nobody()
+        # Give up any capabilities held inside the new namespaces
+        header = struct.pack("Ii", CAPABILITY_VERSION_3, 0)
+        if libc.capset(header, bytes(24)) != 0:
+            return False
+        return libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) == 0
+    except Exception:
+        return False
+
+
+def _apply_limits():
+    resource.setrlimit(resource.RLIMIT_CPU, (CPU_SECONDS, CPU_SECONDS + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (MEMORY_BYTES, MEMORY_BYTES))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def _find_solution(namespace):
+    if callable(namespace.get("two_sum")):
+        return namespace["two_sum"]
+    if callable(namespace.get("twoSum")):
+        return namespace["twoSum"]
+    solution_cls = namespace.get("Solution")
+    if isinstance(solution_cls, type) and hasattr(solution_cls, "twoSum"):
+        return solution_cls().twoSum
+    raise NameError("Define a function named 'two_sum(nums, target)'")
+
+
+def _coerce_output(output):
+    # Only plain lists of plain ints ever leave the worker
+    if output is None:
+        return None
+    if not isinstance(output, (list, tuple)):
+        raise TypeError("two_sum must return a list of indices")
+    if len(output) > MAX_OUTPUT_LENGTH:
+        raise ValueError("two_sum returned too many indices")
+    values = []
+    for value in output:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise TypeError("two_sum must return a list of integer indices")
+        values.append(int.__index__(value))
+    return values
+
+
+def _make_builtins():
+    allowed = dict(builtins.__dict__)
+    for name in DROPPED_BUILTINS:
+        allowed.pop(name, None)
+    modules = sys.modules
+    real_import = builtins.__import__
+
+    def restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level != 0 or name.split(".")[0] not in PRELOADED_MODULES or name not in modules:
+            raise ImportError(f"Import of '{name}' is not allowed")
+        return real_import(name, globals, locals, fromlist, level)
+
+    allowed["__import__"] = restricted_import
+    return allowed
+
+
+def _run_test_cases(code, test_cases):
+    stdout = io.StringIO()
+    namespace = {"__name__": "solution", "__builtins__": _make_builtins()}
+    # Drop references to process, file and network modules; submission code must not find them in sys.modules
+    for name in list(sys.modules):
+        if name.split(".")[0] in DROPPED_MODULES:
+            del sys.modules[name]
+    try:
+        with redirect_stdout(stdout):
+            exec(code, namespace)
+        solution = _find_solution(namespace)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", "outputs": [], "errors": [], "stdout": stdout.getvalue()[:MAX_STDOUT_CHARS]}
+    outputs = []
+    errors = []
+    for nums, target, _expected in test_cases:
+        try:
+            with redirect_stdout(stdout):
+                outputs.append(_coerce_output(solution(list(nums), target)))
+            errors.append(None)
+        except Exception as e:
+            outputs.append(None)
+            errors.append(f"{type(e).__name__}: {e}"[:MAX_ERROR_CHARS])
+    return {"error": None, "outputs": outputs, "errors": errors, "stdout": stdout.getvalue()[:MAX_STDOUT_CHARS]}
+
+
+def _read_all(fd, limit):
+    chunks = []
+    size = 0
+    while size <= limit:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def _worker_main(job_fd, result_fd):
+    # Runs in a child of the helper: detach from everything else, isolate, then wait for one job
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    previous = 3
+    for fd in sorted({job_fd, result_fd}):
+        os.closerange(previous, fd)
+        previous = fd + 1
+    os.closerange(previous, os.sysconf("SC_OPEN_MAX"))
+    os.environ.clear()
+    isolated = _isolate()
+    _apply_limits()
+    job = _read_all(job_fd, MAX_JOB_BYTES)
+    os.close(job_fd)
+    dumps = json.dumps
+    write_all = _write_all
+    pack = RESULT_HEADER.pack
+    if not isolated:
+        # Fail closed: never run a submission without network, filesystem and process isolation
+        body = dumps({"unavailable": True, "error": "Code execution is unavailable: sandbox isolation is not supported on this host"})
+    else:
+        try:
+            request = json.loads(job)
+            outcome = _run_test_cases(request["code"], request["tests"])
+        except BaseException as e:
+            outcome = {"error": f"{type(e).__name__}: {e}", "outputs": [], "errors": [], "stdout": ""}
+        try:
+            body = dumps(outcome)
+        except Exception:
+            body = dumps({"error": "Solution produced a result that could not be returned", "outputs": [], "errors": [], "stdout": ""})
+    data = body.encode("utf-8", "replace")
+    write_all(result_fd, pack(len(data)) + data)
+
+
+def _fork_worker():
+    job_r, job_w = os.pipe()
+    result_r, result_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _worker_main(job_r, result_w)
+        finally:
+            os._exit(0)
+    os.close(job_r)
+    os.close(result_w)
+    return pid, job_w, result_r
+
+
+def _reap(pid, kill):
+    # Returns the wait status; gives a finishing worker a moment before killing it
+    if not kill:
+        for _ in range(20):
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return status
+            time.sleep(0.005)
+    try:
+        os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    return os.waitpid(pid, 0)[1]
+
+
+def _describe_exit(status):
+    if os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL):
+        return f"CPU time limit exceeded ({CPU_SECONDS}s)"
+    if os.WIFSIGNALED(status) or os.WEXITSTATUS(status) != 0:
+        return "Solution crashed, possibly exceeding the memory limit"
+    return "Solution terminated unexpectedly"
+
+
+def _helper_main(size, wall_timeout):
+    """Single-threaded, secret-free process that pre-forks workers and relays jobs for the host."""
+    host_in = os.dup(0)
+    host_out = os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    os.environ.clear()
+    for name in PRELOADED_MODULES:
+        __import__(name)
+
+    selector = selectors.DefaultSelector()
+    selector.register(host_in, selectors.EVENT_READ)
+    idle = deque(_fork_worker() for _ in range(size))
+    running = {}  # result fd -> [job id, pid, buffer, deadline]
+    inbox = b""
+
+    def reply(job_id, kind, body):
+        _write_all(host_out, REPLY_HEADER.pack(job_id, kind, len(body)) + body)
+
+    def error(message):
+        return json.dumps({"error": message}).encode("utf-8")
+
+    def finish(fd, message=None):
+        job_id, pid, buffer, _deadline = running.pop(fd)
+        selector.unregister(fd)
+        os.close(fd)
+        complete = (message is None and len(buffer) >= RESULT_HEADER.size
+                    and len(buffer) == RESULT_HEADER.size + RESULT_HEADER.unpack_from(buffer)[0])
+        status = _reap(pid, kill=message is not None)
+        if complete:
+            reply(job_id, KIND_RESULT, bytes(buffer[RESULT_HEADER.size:]))
+        else:
+            reply(job_id, KIND_ERROR, error(message or _describe_exit(status)))
+
+    def dispatch(job_id, body):
+        pid, job_w, result_r = idle.popleft() if idle else _fork_worker()
+        try:
+            _write_all(job_w, body)
+        except OSError:
+            _reap(pid, kill=True)
+            os.close(result_r)
+            reply(job_id, KIND_ERROR, error("Sandbox worker was not available"))
+            return
+        finally:
+            os.close(job_w)
+        running[result_r] = [job_id, pid, bytearray(), time.monotonic() + wall_timeout]
+        selector.register(result_r, selectors.EVENT_READ)
+
+    while True:
+        deadlines = [job[3] for job in running.values()]
+        timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+        for key, _ in selector.select(timeout):
+            if key.fd == host_in:
+                chunk = os.read(host_in, 65536)
+                if not chunk:
+                    # Host went away: take every worker with us
+                    for pid, job_w, result_r in idle:
+                        _reap(pid, kill=True)
+                    for fd in list(running):
+                        _reap(running[fd][1], kill=True)
+                    return
+                inbox += chunk
+                while len(inbox) >= JOB_HEADER.size:
+                    job_id, length = JOB_HEADER.unpack_from(inbox)
+                    if len(inbox) < JOB_HEADER.size + length:
+                        break
+                    body = inbox[JOB_HEADER.size:JOB_HEADER.size + length]
+                    inbox = inbox[JOB_HEADER.size + length:]
+                    if length > MAX_JOB_BYTES:
+                        reply(job_id, KIND_ERROR, error("Submission is too large"))
+                    else:
+                        dispatch(job_id, body)
+            elif key.fd in running:
+                job = running[key.fd]
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    finish(key.fd)
+                elif len(job[2]) + len(chunk) > RESULT_HEADER.size + MAX_RESULT_BYTES:
+                    finish(key.fd, "Solution produced too much output")
+                else:
+                    job[2] += chunk
+        now = time.monotonic()
+        for fd in [fd for fd, job in running.items() if job[3] <= now]:
+            finish(fd, f"Time limit exceeded ({wall_timeout}s)")
+        while len(idle) < size:
+            idle.append(_fork_worker())
+
+
+def _validate_outcome(kind, body, test_cases):
+    """Build a result from untrusted worker JSON. Returns (outcome, cacheable)."""
+    failed = {"error": "Solution returned a malformed result", "results": [], "stdout": "", "unavailable": False}
+    if len(body) > MAX_RESULT_BYTES:
+        return failed, False
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return failed, False
+    if not isinstance(data, dict):
+        return failed, False
+    error = data.get("error")
+    if error is not None and not isinstance(error, str):
+        return failed, False
+    unavailable = data.get("unavailable") is True
+    stdout = data.get("stdout", "")
+    outcome = {
+        "error": error[:MAX_ERROR_CHARS] if error else None,
+        "results": [],
+        "stdout": stdout[:MAX_STDOUT_CHARS] if isinstance(stdout, str) else "",
+        "unavailable": unavailable,
+    }
+    if kind != KIND_RESULT or unavailable:
+        return outcome, False
+    if error is not None:
+        return outcome, True
+    outputs = data.get("outputs")
+    errors = data.get("errors")
+    if not (isinstance(outputs, list) and isinstance(errors, list)
+            and len(outputs) == len(test_cases) and len(errors) == len(test_cases)):
+        return failed, False
+    for (nums, target, expected), output, test_error in zip(test_cases, outputs, errors):
+        if output is not None and not (
+            isinstance(output, list) and len(output) <= MAX_OUTPUT_LENGTH
+            and all(type(value) is int for value in output)
+        ):
+            return failed, False
+        if test_error is not None and not isinstance(test_error, str):
+            return failed, False
+        # Pass/fail is decided here, never by the worker
+        result = {
+            "input": {"nums": nums, "target": target},
+            "expected": expected,
+            "output": output,
+            "passed": output is not None and sorted(output) == sorted(expected),
+        }
+        if test_error is not None:
+            result["error"] = test_error[:MAX_ERROR_CHARS]
+        outcome["results"].append(result)
+    return outcome, True
+
+
+class SandboxPool:
+    """Runs submissions on single-use workers forked by a dedicated helper process.
+
+    The host never forks workers itself: the helper is started once with an empty
+    environment and no inherited file descriptors, and it is single-threaded.
+    """
+
+    def __init__(self, size=POOL_SIZE, wall_timeout=WALL_TIMEOUT_SECONDS, cache_size=RESULT_CACHE_SIZE):
+        env = {key: os.environ[key] for key in HELPER_ENV_KEYS if key in os.environ}
+        self._process = subprocess.Popen(
+            [sys.executable, "-I", os.path.abspath(__file__), "--helper", str(size), str(wall_timeout)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+            cwd="/",
+            close_fds=True
+        )
+        self._wall_timeout = wall_timeout
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = {}
+        self._next_id = 0
+        self._broken = False
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        threading.Thread(target=self._read_replies, daemon=True).start()
+
+    @property
+    def alive(self):
+        return not self._broken and self._process.poll() is None
+
+    def _read_replies(self):
+        stdout = self._process.stdout
+        while True:
+            header = stdout.read(REPLY_HEADER.size)
+            if len(header) < REPLY_HEADER.size:
+                break
+            job_id, kind, length = REPLY_HEADER.unpack(header)
+            if length > MAX_RESULT_BYTES + 1024:
+                break
+            body = stdout.read(length)
+            if len(body) < length:
+                break
+            with self._lock:
+                slot = self._pending.pop(job_id, None)
+            if slot is not None:
+                slot[1] = (kind, body)
+                slot[0].set()
+        # Helper exited or broke the protocol: fail everything still waiting
+        with self._lock:
+            self._broken = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for slot in pending:
+            slot[1] = (KIND_ERROR, json.dumps({"error": "Sandbox helper stopped", "unavailable": True}).encode("utf-8"))
+            slot[0].set()
+
+    def run(self, code, test_cases=TWO_SUM_TEST_CASES, use_cache=True):
+        """Run every test case for a submission in a single worker round trip."""
+        tests_digest = hashlib.sha256(json.dumps(test_cases, sort_keys=True).encode("utf-8")).hexdigest()
+        key = hashlib.sha256(code.encode("utf-8")).hexdigest() + tests_digest
+        if use_cache:
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return dict(self._cache[key], cached=True)
+        if not self.alive:
+            raise RuntimeError("Sandbox helper process is not running")
+        body = json.dumps({"code": code, "tests": test_cases}).encode("utf-8")
+        slot = [threading.Event(), None]
+        with self._lock:
+            self._next_id += 1
+            job_id = self._next_id
+            self._pending[job_id] = slot
+        started = time.monotonic()
+        try:
+            with self._write_lock:
+                self._process.stdin.write(JOB_HEADER.pack(job_id, len(body)) + body)
+                self._process.stdin.flush()
+        except OSError:
+            with self._lock:
+                self._broken = True
+                self._pending.pop(job_id, None)
+            raise RuntimeError("Sandbox helper process is not running")
+        if slot[0].wait(self._wall_timeout + 5):
+            outcome, cacheable = _validate_outcome(*slot[1], test_cases)
+        else:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            outcome, cacheable = {"error": "Sandbox did not respond in time", "results": [], "stdout": "", "unavailable": False}, False
+        outcome["all_passed"] = bool(outcome["results"]) and all(r["passed"] for r in outcome["results"])
+        outcome["duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+        # Only cache outcomes the worker reached on its own; timeouts and crashes may be host load
+        if use_cache and cacheable:
+            with self._lock:
+                self._cache[key] = outcome
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return dict(outcome, cached=False)
+
+    def close(self):
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            self._process.wait()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or not _pool.alive:
+            if _pool is not None:
+                _pool.close()
+            _pool = SandboxPool()
+        return _pool
+
+
+if __name__ == "__main__" and len(sys.argv) == 4 and sys.argv[1] == "--helper":
+    _helper_main(int(sys.argv[2]), float(sys.argv[3]))
@@ -1,16 +1,32 @@
+import hmac
 import logging
 import azure.functions as func
 import os
-import json
 from azure.data.tables import TableServiceClient, UpdateMode
 from datetime import datetime, timedelta
 from openai import AzureOpenAI
 import re
 import traceback
+from shared_code import traffic_capture
+from . import snippet_index
+from .admission import AdmissionController
+from .responses import PLAIN, ResponseFormat, json_response
 
 RATE_LIMIT = 10  # max requests
 WINDOW_SECONDS = 60 * 3  # per 3 minutes
 
+# Admission control: lower priority number is admitted first; queue_timeout is in seconds
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "8"))
+ADMISSION_QUEUE_LIMIT = int(os.environ.get("ADMISSION_QUEUE_LIMIT", "8"))
+ADMISSION_ROUTES = {
+    "tower-snippet": {"priority": 0, "max_in_flight": 6, "queue_timeout": 0.5},
+    "chat": {"priority": 1, "max_in_flight": 4, "queue_timeout": 2.0},
+}
+# GET /metrics is disabled unless this is set; callers must send it in X-Metrics-Key
+ADMISSION_METRICS_KEY = os.environ.get("ADMISSION_METRICS_KEY", "")
+
+TOWER_TYPES = ['ForLoop', 'WhileLoop', 'IfCondition', 'ReturnStatement', 'Variable', 'Function', 'Array', 'Object', 'TryCatch', 'Switch']
+
 SYSTEM_PROMPTS = {
     "hints": {
         "role": "system",
@@ -54,6 +70,14 @@ SYSTEM_PROMPTS = {
     }
 }
 
+admission_controller = AdmissionController(ADMISSION_ROUTES, ADMISSION_MAX_IN_FLIGHT, ADMISSION_QUEUE_LIMIT)
+
+def is_metrics_request(req: func.HttpRequest):
+    if req.method != "GET" or not ADMISSION_METRICS_KEY:
+        return False
+    key = req.headers.get('X-Metrics-Key', '')
+    return hmac.compare_digest(key.encode('utf-8'), ADMISSION_METRICS_KEY.encode('utf-8'))
+
 def is_rate_limited(ip: str):
     conn_str = os.environ["DEPLOYMENT_STORAGE_CONNECTION_STRING"]
     table_name = "RateLimit"
@@ -93,12 +117,13 @@ def is_rate_limited(ip: str):
         table.upsert_entity(entity)
         return False, RATE_LIMIT-1, WINDOW_SECONDS
 
+@traffic_capture.capture("NewMethodProxy")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     # Define CORS headers
     cors_headers = {
         "Access-Control-Allow-Origin": "http://localhost:4000, http://127.0.0.1:4000, https://rivie13.github.io",
-        "Access-Control-Allow-Methods": "POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization",
+        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, Authorization, X-Response-Format, X-Metrics-Key",
     }
     
     # Handle CORS preflight
@@ -110,6 +135,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     logging.info('Entered main() for NewMethodProxy')
+    # Negotiate compression and the optional compact schema once for every JSON response
+    response_format = ResponseFormat.from_request(req)
     ip = req.headers.get('X-Forwarded-For') or req.headers.get('X-Client-IP') or 'unknown'
     logging.info(f'Received request from IP: {ip}')
     
@@ -117,30 +144,46 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     subroute = req.route_params.get('subroute', '')
     logging.info(f'Route subroute: {subroute}')
     
+    # Admission metrics are for operators holding the metrics key; nothing else answers GET
+    if subroute == 'metrics' and is_metrics_request(req):
+        return json_response(
+            admission_controller.snapshot(),
+            cors_headers,
+            response_format
+        )
+    if req.method != "POST":
+        return json_response(
+            {"error": "Method not allowed"},
+            cors_headers,
+            response_format,
+            status_code=405,
+            headers={"Allow": "POST, OPTIONS"}
+        )
+    
     # Handle rate limiting
     try:
         is_limited, requests_remaining, reset_seconds = is_rate_limited(ip)
         if is_limited:
-            return func.HttpResponse(
-                json.dumps({
+            return json_response(
+                {
                     "error": "Too many requests. Please slow down.",
                     "requests_remaining": requests_remaining,
                     "reset_seconds": reset_seconds
-                }),
-                mimetype="application/json",
-                status_code=429,
-                headers=cors_headers
+                },
+                cors_headers,
+                response_format,
+                status_code=429
             )
     except Exception as e:
-        return func.HttpResponse(
-            json.dumps({
+        return json_response(
+            {
                 "error": f"Error: {str(e)}",
                 "requests_remaining": 0,
                 "reset_seconds": WINDOW_SECONDS
-            }),
-            mimetype="application/json",
-            status_code=500,
-            headers=cors_headers
+            },
+            cors_headers,
+            response_format,
+            status_code=500
         )
     
     # Parse request body
@@ -149,96 +192,112 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         logging.info(f'Request body: {req_body}')
     except ValueError as e:
         logging.error("Failed to parse JSON body", exc_info=True)
-        return func.HttpResponse(
-            json.dumps({"error": "Please pass a valid JSON object in the request body"}),
-            mimetype="application/json",
-            status_code=400,
-            headers=cors_headers
+        return json_response(
+            {"error": "Please pass a valid JSON object in the request body"},
+            cors_headers,
+            response_format,
+            status_code=400
+        )
+    
+    if subroute not in ADMISSION_ROUTES:
+        return json_response(
+            {"error": f"Invalid subroute: {subroute}"},
+            cors_headers,
+            response_format,
+            status_code=400
         )
     
     # Route handling
     if subroute == 'chat':
-        return handle_chat(req_body, requests_remaining, reset_seconds, cors_headers)
-    elif subroute == 'tower-snippet':
-        logging.warning('Dispatching to tower_snippet()')
-        return tower_snippet(req, requests_remaining, reset_seconds, cors_headers)
-    else:
-        return func.HttpResponse(
-            json.dumps({"error": f"Invalid subroute: {subroute}"}),
-            mimetype="application/json",
-            status_code=400,
-            headers=cors_headers
-        )
+        return handle_chat(req_body, requests_remaining, reset_seconds, cors_headers, response_format)
+    logging.warning('Dispatching to tower_snippet()')
+    return tower_snippet(req, requests_remaining, reset_seconds, cors_headers, response_format)
 
-def handle_chat(req_body, requests_remaining, reset_seconds, cors_headers):
+def shed_response(route, requests_remaining, reset_seconds, cors_headers, response_format=PLAIN):
+    """503 + Retry-After for a request the admission controller could not admit in time"""
+    retry_after = admission_controller.retry_after(route)
+    return json_response(
+        {
+            "error": "The assistant is busy right now. Please try again shortly.",
+            "retry_after": retry_after,
+            "requests_remaining": requests_remaining,
+            "reset_seconds": reset_seconds
+        },
+        cors_headers,
+        response_format,
+        status_code=503,
+        headers={"Retry-After": str(retry_after)}
+    )
+
+def handle_chat(req_body, requests_remaining, reset_seconds, cors_headers, response_format=PLAIN):
     """Handle chat requests"""
     messages = req_body.get('messages')
     assistance_level = req_body.get('assistanceLevel', 'hints_only')
     
     if not messages:
-        return func.HttpResponse(
-            json.dumps({"error": "Please pass 'messages' in the request body"}),
-            mimetype="application/json",
-            status_code=400,
-            headers=cors_headers
+        return json_response(
+            {"error": "Please pass 'messages' in the request body"},
+            cors_headers,
+            response_format,
+            status_code=400
         )
     
     # Validate messages format and content
     if not isinstance(messages, list):
-        return func.HttpResponse(
-            json.dumps({"error": "Messages must be a list"}),
-            mimetype="application/json",
-            status_code=400,
-            headers=cors_headers
+        return json_response(
+            {"error": "Messages must be a list"},
+            cors_headers,
+            response_format,
+            status_code=400
         )
     
     # Validate each message
     for msg in messages:
         if not isinstance(msg, dict):
-            return func.HttpResponse(
-                json.dumps({"error": "Each message must be an object"}),
-                mimetype="application/json",
-                status_code=400,
-                headers=cors_headers
+            return json_response(
+                {"error": "Each message must be an object"},
+                cors_headers,
+                response_format,
+                status_code=400
             )
         if 'role' not in msg or 'content' not in msg:
-            return func.HttpResponse(
-                json.dumps({"error": "Each message must have 'role' and 'content' fields"}),
-                mimetype="application/json",
-                status_code=400,
-                headers=cors_headers
+            return json_response(
+                {"error": "Each message must have 'role' and 'content' fields"},
+                cors_headers,
+                response_format,
+                status_code=400
             )
         if msg['role'] not in ['user', 'assistant', 'system']:
-            return func.HttpResponse(
-                json.dumps({"error": "Invalid message role"}),
-                mimetype="application/json",
-                status_code=400,
-                headers=cors_headers
+            return json_response(
+                {"error": "Invalid message role"},
+                cors_headers,
+                response_format,
+                status_code=400
             )
         if not isinstance(msg['content'], str):
-            return func.HttpResponse(
-                json.dumps({"error": "Message content must be a string"}),
-                mimetype="application/json",
-                status_code=400,
-                headers=cors_headers
+            return json_response(
+                {"error": "Message content must be a string"},
+                cors_headers,
+                response_format,
+                status_code=400
             )
         # Only limit length for user messages
         if msg['role'] == 'user' and len(msg['content']) > 1000:
-            return func.HttpResponse(
-                json.dumps({"error": "Message content too long"}),
-                mimetype="application/json",
-                status_code=400,
-                headers=cors_headers
+            return json_response(
+                {"error": "Message content too long"},
+                cors_headers,
+                response_format,
+                status_code=400
             )
     
     # Validate assistance level
     valid_levels = ['hints_only', 'full_solution', 'step_by_step', 'debug_mode', 'learning_mode', 'chat']
     if assistance_level not in valid_levels:
-        return func.HttpResponse(
-            json.dumps({"error": "Invalid assistance level"}),
-            mimetype="application/json",
-            status_code=400,
-            headers=cors_headers
+        return json_response(
+            {"error": "Invalid assistance level"},
+            cors_headers,
+            response_format,
+            status_code=400
         )
     
     # Get OpenAI configuration
@@ -249,11 +308,11 @@ def handle_chat(req_body, requests_remaining, reset_seconds, cors_headers):
     
     if not (AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY):
         logging.error("OpenAI service is not configured.")
-        return func.HttpResponse(
-            json.dumps({"error": "OpenAI service is not configured."}),
-            mimetype="application/json",
-            status_code=500,
-            headers=cors_headers
+        return json_response(
+            {"error": "OpenAI service is not configured."},
+            cors_headers,
+            response_format,
+            status_code=500
         )
     
     # Map assistance_level to SYSTEM_PROMPTS key
@@ -273,11 +332,11 @@ def handle_chat(req_body, requests_remaining, reset_seconds, cors_headers):
     
     # Limit total messages to prevent abuse
     if len(openai_messages) > 20:
-        return func.HttpResponse(
-            json.dumps({"error": "Too many messages in conversation"}),
-            mimetype="application/json",
-            status_code=400,
-            headers=cors_headers
+        return json_response(
+            {"error": "Too many messages in conversation"},
+            cors_headers,
+            response_format,
+            status_code=400
         )
     
     client = AzureOpenAI(
@@ -286,6 +345,10 @@ def handle_chat(req_body, requests_remaining, reset_seconds, cors_headers):
         api_version=AZURE_OPENAI_API_VERSION
     )
     
+    # Admission control covers only the upstream call: wait briefly for a slot, or shed
+    ticket = admission_controller.acquire('chat')
+    if ticket is None:
+        return shed_response('chat', requests_remaining, reset_seconds, cors_headers, response_format)
     try:
         response = client.chat.completions.create(
             model=AZURE_OPENAI_DEPLOYMENT_NAME,
@@ -303,24 +366,26 @@ def handle_chat(req_body, requests_remaining, reset_seconds, cors_headers):
         else:
             ai_response = str(ai_response)
         logging.info('OpenAI call successful')
-        return func.HttpResponse(
-            json.dumps({
+        return json_response(
+            {
                 "response": ai_response,
                 "requests_remaining": requests_remaining,
                 "reset_seconds": reset_seconds
-            }),
-            mimetype="application/json",
-            headers=cors_headers
+            },
+            cors_headers,
+            response_format
         )
     except Exception as e:
         logging.error("Error calling Azure OpenAI", exc_info=True)
         # Don't expose internal error details to client
-        return func.HttpResponse(
-            json.dumps({"error": "Error processing your request with AI assistant"}),
-            mimetype="application/json",
-            status_code=500,
-            headers=cors_headers
+        return json_response(
+            {"error": "Error processing your request with AI assistant"},
+            cors_headers,
+            response_format,
+            status_code=500
         )
+    finally:
+        admission_controller.release(ticket)
 
 def extract_single_line_of_code(response_text):
     # Remove markdown code blocks and comments
@@ -333,33 +398,15 @@ def extract_single_line_of_code(response_text):
             return line
     return code.strip()
 
-def tower_snippet(req: func.HttpRequest, requests_remaining, reset_seconds, cors_headers) -> func.HttpResponse:
-    logging.info('Entered tower_snippet() for NewMethodProxy')
-    try:
-        req_body = req.get_json()
-        logging.warning(f"Parsed request body in tower_snippet: {req_body}")
-    except Exception as e:
-        logging.error("Failed to parse JSON body in tower_snippet: %s", traceback.format_exc())
-        resp = func.HttpResponse(
-            "Please pass a valid JSON object in the request body", 
-            status_code=400,
-            headers=cors_headers
-        )
-        logging.warning(f"Returning error response in tower_snippet: {resp.get_body()}")
-        return resp
-    context = req_body.get('context', {})
-    tower_type = req_body.get('towerType')
-    user_info = req_body.get('userInfo', {})
-    if not tower_type or not context:
-        logging.error("Missing 'context' or 'towerType' in tower_snippet request body")
-        resp = func.HttpResponse(
-            "Please pass 'context' and 'towerType' in the request body", 
-            status_code=400,
-            headers=cors_headers
-        )
-        logging.warning(f"Returning error response in tower_snippet: {resp.get_body()}")
-        return resp
-    simplified_prompt = f"Generate ONLY a single, essential line of code for a {tower_type} in {context.get('language', 'Python')}\n\nCONTEXT:\nProblem: {context.get('problem', {}).get('title') or context.get('problem', {}).get('description') or context.get('problem', 'No problem description available')}\nLanguage: {context.get('language', 'Python')}\nTower Type: {tower_type}\nExisting Code Structure (DO NOT REPEAT CODE FROM HERE):\n```\n{context.get('code', '// No existing code provided')}\n```\n\nREQUIREMENTS FOR THE SINGLE LINE OF CODE:\n- Return EXACTLY ONE LINE of code relevant to the {tower_type}.\n- The line should be the next logical step for this tower type.\n- NO explanations, NO markdown formatting (like ```), NO comments.\n- Use variable names and styles consistent with the existing code if possible, but prioritize a single, correct line.\n- If this is tower number {context.get('towerCount', 1)} of this type, ensure any new variable in this line is named appropriately (e.g., item{context.get('towerCount', 1)}).\n\nSPECIFIC FORMAT FOR THE SINGLE LINE OF {tower_type.upper()}:\n"
+def get_problem_text(context):
+    problem = context.get('problem', 'No problem description available')
+    if isinstance(problem, dict):
+        return problem.get('title') or problem.get('description') or problem
+    return problem
+
+def build_snippet_prompt(tower_type, context):
+    """Build the single-line snippet prompt; shared with the offline index builder"""
+    simplified_prompt = f"Generate ONLY a single, essential line of code for a {tower_type} in {context.get('language', 'Python')}\n\nCONTEXT:\nProblem: {get_problem_text(context)}\nLanguage: {context.get('language', 'Python')}\nTower Type: {tower_type}\nExisting Code Structure (DO NOT REPEAT CODE FROM HERE):\n```\n{context.get('code', '// No existing code provided')}\n```\n\nREQUIREMENTS FOR THE SINGLE LINE OF CODE:\n- Return EXACTLY ONE LINE of code relevant to the {tower_type}.\n- The line should be the next logical step for this tower type.\n- NO explanations, NO markdown formatting (like ```), NO comments.\n- Use variable names and styles consistent with the existing code if possible, but prioritize a single, correct line.\n- If this is tower number {context.get('towerCount', 1)} of this type, ensure any new variable in this line is named appropriately (e.g., item{context.get('towerCount', 1)}).\n\nSPECIFIC FORMAT FOR THE SINGLE LINE OF {tower_type.upper()}:\n"
     if tower_type == 'ForLoop':
         simplified_prompt += "- Python: A 'for' loop declaration line ending with ':'. Example: 'for i in range(len(items)):'\n- JS/Java: A 'for' loop declaration line ending with '{'. Example: 'for (let i = 0; i < items.length; i++) {'"
     elif tower_type == 'WhileLoop':
@@ -383,24 +430,62 @@ def tower_snippet(req: func.HttpRequest, requests_remaining, reset_seconds, cors
     else:
         simplified_prompt += f"- Generate the most essential single line of code for a {tower_type}."
     simplified_prompt += "\n\nReturn ONLY the single line of code."
+    return simplified_prompt
+
+def tower_snippet(req: func.HttpRequest, requests_remaining, reset_seconds, cors_headers, response_format=PLAIN) -> func.HttpResponse:
+    logging.info('Entered tower_snippet() for NewMethodProxy')
+    try:
+        req_body = req.get_json()
+        logging.warning(f"Parsed request body in tower_snippet: {req_body}")
+    except Exception as e:
+        logging.error("Failed to parse JSON body in tower_snippet: %s", traceback.format_exc())
+        payload = {"error": "Please pass a valid JSON object in the request body"}
+        logging.warning(f"Returning error response in tower_snippet: {payload}")
+        return json_response(payload, cors_headers, response_format, status_code=400)
+    context = req_body.get('context', {})
+    tower_type = req_body.get('towerType')
+    user_info = req_body.get('userInfo', {})
+    if not tower_type or not context:
+        logging.error("Missing 'context' or 'towerType' in tower_snippet request body")
+        payload = {"error": "Please pass 'context' and 'towerType' in the request body"}
+        logging.warning(f"Returning error response in tower_snippet: {payload}")
+        return json_response(payload, cors_headers, response_format, status_code=400)
+    language = context.get('language', 'Python')
+    code = context.get('code', '')
+    tower_count = context.get('towerCount', 1)
+
+    # Serve known problem/tower/code combinations from the pre-generated index
+    indexed_snippet = snippet_index.lookup(tower_type, language, get_problem_text(context), code, tower_count)
+    if indexed_snippet is not None:
+        logging.info('Serving tower snippet from pre-generated index')
+        return json_response(
+            {
+                "snippet": indexed_snippet,
+                "requests_remaining": requests_remaining,
+                "reset_seconds": reset_seconds
+            },
+            cors_headers,
+            response_format
+        )
+    simplified_prompt = build_snippet_prompt(tower_type, context)
     AZURE_OPENAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
     AZURE_OPENAI_API_KEY = os.environ.get("AZURE_OPENAI_API_KEY")
     AZURE_OPENAI_DEPLOYMENT_NAME = os.environ.get("AZURE_DEPLOYMENT_NAME", "gpt-4o")
     AZURE_OPENAI_API_VERSION = os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
     if not (AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY):
         logging.error("OpenAI service is not configured in tower_snippet.")
-        resp = func.HttpResponse(
-            "OpenAI service is not configured.", 
-            status_code=500,
-            headers=cors_headers
-        )
-        logging.warning(f"Returning error response in tower_snippet: {resp.get_body()}")
-        return resp
+        payload = {"error": "OpenAI service is not configured."}
+        logging.warning(f"Returning error response in tower_snippet: {payload}")
+        return json_response(payload, cors_headers, response_format, status_code=500)
     client = AzureOpenAI(
         azure_endpoint=AZURE_OPENAI_ENDPOINT,
         api_key=AZURE_OPENAI_API_KEY,
         api_version=AZURE_OPENAI_API_VERSION
     )
+    # Index hits above never take a slot, so they are not queued behind model calls
+    ticket = admission_controller.acquire('tower-snippet')
+    if ticket is None:
+        return shed_response('tower-snippet', requests_remaining, reset_seconds, cors_headers, response_format)
     try:
         logging.warning(f"Calling Azure OpenAI in tower_snippet with prompt: {simplified_prompt}")
         response = client.chat.completions.create(
@@ -415,19 +500,18 @@ def tower_snippet(req: func.HttpRequest, requests_remaining, reset_seconds, cors
         raw_response = response.choices[0].message.content
         logging.warning(f"Azure OpenAI response in tower_snippet: {raw_response}")
         code_line = extract_single_line_of_code(raw_response)
-        resp = func.HttpResponse(
-            json.dumps({
-                "snippet": code_line,
-                "requests_remaining": requests_remaining,
-                "reset_seconds": reset_seconds
-            }),
-            mimetype="application/json",
-            headers=cors_headers
-        )
-        logging.warning(f"Returning final response in tower_snippet: {resp.get_body()}")
-        return resp
+        payload = {
+            "snippet": code_line,
+            "requests_remaining": requests_remaining,
+            "reset_seconds": reset_seconds
+        }
+        # Log the payload, not the body: the body may be gzip/brotli-compressed
+        logging.warning(f"Returning final response in tower_snippet: {payload}")
+        return json_response(payload, cors_headers, response_format)
     except Exception as e:
         logging.error("Error calling Azure OpenAI for tower snippet: %s", traceback.format_exc())
-        resp = func.HttpResponse(f"Error processing your request for tower snippet: {str(e)}", status_code=500, headers=cors_headers)
-        logging.warning(f"Returning error response in tower_snippet: {resp.get_body()}")
-        return resp 
\ No newline at end of file
+        payload = {"error": f"Error processing your request for tower snippet: {str(e)}"}
+        logging.warning(f"Returning error response in tower_snippet: {payload}")
+        return json_response(payload, cors_headers, response_format, status_code=500)
+    finally:
+        admission_controller.release(ticket)
@@ -0,0 +1,145 @@
+import bisect
+import itertools
+import logging
+import math
+import threading
+import time
+
+MAX_RETRY_AFTER_SECONDS = 30
+SERVICE_TIME_SMOOTHING = 0.2  # weight of the newest sample in the service-time average
+
+
+class _Waiter:
+    __slots__ = ("route", "priority", "seq", "deadline", "evicted")
+
+    def __init__(self, route, priority, seq, deadline):
+        self.route = route
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+        self.evicted = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """Bounded-concurrency admission with per-route in-flight limits and a short priority queue.
+
+    routes maps a route name to {"priority", "max_in_flight", "queue_timeout"}; a lower
+    priority number is admitted first. Requests that cannot be admitted before their
+    queue_timeout, or that are pushed out of a full queue, are shed.
+    """
+
+    def __init__(self, routes, max_in_flight, queue_limit):
+        self._routes = routes
+        self._max_in_flight = max_in_flight
+        self._queue_limit = queue_limit
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._total_in_flight = 0
+        self._in_flight = {route: 0 for route in routes}
+        self._service_seconds = {route: 0.0 for route in routes}
+        self._admitted = {route: 0 for route in routes}
+        self._shed = {route: 0 for route in routes}
+
+    def _has_room(self, route):
+        return (self._total_in_flight < self._max_in_flight
+                and self._in_flight[route] < self._routes[route]["max_in_flight"])
+
+    def _next_eligible(self):
+        for waiter in self._waiting:
+            if self._has_room(waiter.route):
+                return waiter
+        return None
+
+    def _expected_wait(self, waiter):
+        # Requests of the same route ahead of us drain at max_in_flight per service time
+        ahead = sum(1 for other in self._waiting if other.route == waiter.route and other < waiter)
+        return self._service_seconds[waiter.route] * (ahead + 1) / self._routes[waiter.route]["max_in_flight"]
+
+    def _remove(self, waiter):
+        index = bisect.bisect_left(self._waiting, waiter)
+        if index < len(self._waiting) and self._waiting[index] is waiter:
+            del self._waiting[index]
+        self._cond.notify_all()
+
+    def _admit(self, waiter):
+        self._remove(waiter)
+        self._in_flight[waiter.route] += 1
+        self._total_in_flight += 1
+        self._admitted[waiter.route] += 1
+        return (waiter.route, time.monotonic())
+
+    def _reject(self, waiter, reason):
+        self._remove(waiter)
+        self._shed[waiter.route] += 1
+        logging.warning(f"Shedding {waiter.route} request ({reason}); queue depth {len(self._waiting)}")
+        return None
+
+    def acquire(self, route):
+        """Wait for an in-flight slot. Returns a ticket for release(), or None if the request was shed."""
+        config = self._routes[route]
+        with self._cond:
+            waiter = _Waiter(route, config["priority"], next(self._seq), time.monotonic() + config["queue_timeout"])
+            bisect.insort(self._waiting, waiter)
+            if self._next_eligible() is waiter:
+                return self._admit(waiter)
+            if self._expected_wait(waiter) > config["queue_timeout"]:
+                return self._reject(waiter, "expected wait exceeds queue timeout")
+            if len(self._waiting) > self._queue_limit:
+                # Full queue: drop the lowest-priority, newest waiter, which may be this one
+                lowest = self._waiting[-1]
+                if lowest is waiter:
+                    return self._reject(waiter, "queue full")
+                lowest.evicted = True
+                self._remove(lowest)
+            while True:
+                if waiter.evicted:
+                    self._shed[route] += 1
+                    logging.warning(f"Shedding {route} request (evicted by higher priority); queue depth {len(self._waiting)}")
+                    return None
+                if self._next_eligible() is waiter:
+                    return self._admit(waiter)
+                remaining = waiter.deadline - time.monotonic()
+                if remaining <= 0:
+                    return self._reject(waiter, "queue timeout")
+                self._cond.wait(remaining)
+
+    def release(self, ticket):
+        route, started = ticket
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._in_flight[route] -= 1
+            self._total_in_flight -= 1
+            previous = self._service_seconds[route]
+            self._service_seconds[route] = elapsed if previous == 0 else (
+                SERVICE_TIME_SMOOTHING * elapsed + (1 - SERVICE_TIME_SMOOTHING) * previous
+            )
+            self._cond.notify_all()
+
+    def retry_after(self, route):
+        """Seconds a shed client should wait, from the current queue and recent service times."""
+        with self._cond:
+            estimate = self._service_seconds[route] * (len(self._waiting) + 1) / self._routes[route]["max_in_flight"]
+        return min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(estimate)))
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "in_flight": self._total_in_flight,
+                "max_in_flight": self._max_in_flight,
+                "queue_depth": len(self._waiting),
+                "queue_limit": self._queue_limit,
+                "routes": {
+                    route: {
+                        "in_flight": self._in_flight[route],
+                        "queued": sum(1 for waiter in self._waiting if waiter.route == route),
+                        "admitted": self._admitted[route],
+                        "shed": self._shed[route],
+                        "avg_service_ms": round(self._service_seconds[route] * 1000, 1),
+                    }
+                    for route in self._routes
+                },
+            }
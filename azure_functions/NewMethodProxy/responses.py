@@ -0,0 +1,142 @@
+import json
+import zlib
+import azure.functions as func
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 512  # below this the encoding overhead outweighs the savings
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # quality 11 costs several ms per chat answer for a few percent more
+
+# json.dumps(separators=...) builds a new encoder on every call; reuse one instead
+_encoder = json.JSONEncoder(separators=(',', ':'))
+
+# Short keys for clients that opt into the compact schema
+COMPACT_KEYS = {
+    "response": "r",
+    "snippet": "s",
+    "error": "e",
+    "requests_remaining": "n",
+    "reset_seconds": "t",
+    "retry_after": "ra",
+}
+
+
+class ResponseFormat:
+    """How a client wants JSON bodies encoded, negotiated once per request."""
+
+    __slots__ = ("encoding", "compact")
+
+    def __init__(self, encoding=None, compact=False):
+        self.encoding = encoding
+        self.compact = compact
+
+    @classmethod
+    def from_request(cls, req):
+        compact = (req.headers.get('X-Response-Format', '').lower() == 'compact'
+                   or req.params.get('format', '').lower() == 'compact')
+        return cls(negotiate_encoding(req.headers.get('Accept-Encoding', '')), compact)
+
+
+PLAIN = ResponseFormat()
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, honouring q-values; None means identity."""
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        pieces = part.strip().split(';')
+        name = pieces[0].strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    for name in candidates:
+        q = weights.get(name, weights.get('*', 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (name, q)
+    return best[0] if best else None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return zlib.compress(data, GZIP_LEVEL, wbits=31)
+    return data
+
+
+def encode_body(payload, response_format=PLAIN):
+    """Serialize a payload; returns (body, Content-Encoding or None)."""
+    if response_format.compact:
+        payload = {COMPACT_KEYS.get(key, key): value for key, value in payload.items()}
+    body = _encoder.encode(payload).encode('utf-8')
+    if response_format.encoding and len(body) >= MIN_COMPRESS_BYTES:
+        return compress(body, response_format.encoding), response_format.encoding
+    return body, None
+
+
+def json_response(payload, cors_headers, response_format=PLAIN, status_code=200, headers=None):
+    body, content_encoding = encode_body(payload, response_format)
+    response_headers = {**cors_headers, **(headers or {}), "Vary": "Accept-Encoding"}
+    if content_encoding:
+        response_headers["Content-Encoding"] = content_encoding
+    return func.HttpResponse(
+        body,
+        mimetype="application/json",
+        status_code=status_code,
+        headers=response_headers
+    )
+
+
+class StreamCompressor:
+    """Compress streamed output frame by frame; each frame is flushed so the client can decode it on arrival.
+
+    Coalesce tokens into sentence-sized frames first: a flush per token costs more bytes than it saves.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        else:
+            self._compressor = None
+
+    def frame(self, data):
+        if self._compressor is None:
+            return data
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self._compressor is None:
+            return b''
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def iter_compressed(frames, encoding):
+    compressor = StreamCompressor(encoding)
+    for data in frames:
+        chunk = compressor.frame(data)
+        if chunk:
+            yield chunk
+    tail = compressor.finish()
+    if tail:
+        yield tail
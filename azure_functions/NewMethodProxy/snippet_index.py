@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+# Pre-generated tower snippets, built offline by scripts/build_snippet_index.py
+INDEX_PATH = os.environ.get(
+    "SNIPPET_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "snippet_index.sqlite")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    tower_type TEXT NOT NULL,
+    language TEXT NOT NULL,
+    problem TEXT NOT NULL,
+    code_hash TEXT NOT NULL,
+    variant INTEGER NOT NULL,
+    snippet TEXT NOT NULL,
+    PRIMARY KEY (tower_type, language, problem, code_hash, variant)
+) WITHOUT ROWID
+"""
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def normalize_problem(problem):
+    return " ".join(str(problem).lower().split())
+
+
+def code_hash(code):
+    # Ignore indentation and blank-line differences between otherwise identical code contexts
+    lines = [line.strip() for line in str(code or "").splitlines() if line.strip()]
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(tower_type, language, problem, code):
+    return (str(tower_type), str(language).lower(), normalize_problem(problem), code_hash(code))
+
+
+def load_index(path=INDEX_PATH):
+    """Load every snippet into memory so lookups are a single dict access."""
+    index = {}
+    if not os.path.exists(path):
+        logging.info(f"Snippet index not found at {path}; all snippets will come from the model")
+        return index
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT tower_type, language, problem, code_hash, variant, snippet FROM snippets ORDER BY variant"
+        )
+        for tower_type, language, problem, hashed_code, _variant, snippet in rows:
+            index.setdefault((tower_type, language, problem, hashed_code), []).append(snippet)
+    finally:
+        conn.close()
+    logging.info(f"Loaded {len(index)} snippet index entries from {path}")
+    return index
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = load_index()
+                except sqlite3.Error:
+                    logging.error("Failed to load snippet index", exc_info=True)
+                    _index = {}
+    return _index
+
+
+def lookup(tower_type, language, problem, code, tower_count=1):
+    """Return the pre-generated snippet for this context, or None if it has not been seen."""
+    variants = get_index().get(make_key(tower_type, language, problem, code))
+    if not variants:
+        return None
+    # Variant N was generated for tower number N, so its naming matches
+    try:
+        position = int(tower_count) - 1
+    except (TypeError, ValueError):
+        position = 0
+    if 0 <= position < len(variants):
+        return variants[position]
+    return None
+
+
+def write_index(rows, path=INDEX_PATH):
+    """Write (tower_type, language, problem, code, variant, snippet) rows to a fresh index file."""
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(SCHEMA)
+        conn.executemany(
+            "INSERT OR REPLACE INTO snippets VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (*make_key(tower_type, language, problem, code), variant, snippet)
+                for tower_type, language, problem, code, variant, snippet in rows
+            ]
+        )
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
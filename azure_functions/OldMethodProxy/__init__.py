@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from openai import AzureOpenAI
 import re
 import traceback
+from shared_code import traffic_capture
 
 RATE_LIMIT = 10  # max requests
 WINDOW_SECONDS = 60 * 3  # per 3 minutes
@@ -69,6 +70,7 @@ def is_rate_limited(ip: str):
         table.upsert_entity(entity)
         return False, RATE_LIMIT-1, WINDOW_SECONDS
 
+@traffic_capture.capture("OldMethodProxy")
 def main(req: func.HttpRequest) -> func.HttpResponse:
     # Handle CORS preflight
     if req.method == "OPTIONS":
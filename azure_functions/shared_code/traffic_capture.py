@@ -0,0 +1,104 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Opt-in: set TRAFFIC_CAPTURE_PATH to append one anonymised envelope per request.
+# No message text, code or IP address is written, only shapes and timings.
+CAPTURE_PATH = os.environ.get("TRAFFIC_CAPTURE_PATH")
+# Client ids are salted hashes. The salt is a setting, so one client keeps the same id across
+# worker processes, instances and restarts; use a fresh random value for each capture and never
+# store it with the capture file, or ids could be reversed by hashing every IPv4 address.
+CAPTURE_SALT = os.environ.get("TRAFFIC_CAPTURE_SALT", "")
+MIN_SALT_LENGTH = 16
+
+_salt = CAPTURE_SALT.encode("utf-8")
+_fd = None
+_fd_lock = threading.Lock()
+
+
+def _client_id(ip):
+    return hashlib.sha256(_salt + ip.encode("utf-8")).hexdigest()[:8]
+
+
+def build_envelope(function_name, req, status_code, started, elapsed):
+    body = req.get_body() or b""
+    try:
+        payload = json.loads(body) if body else {}
+    except ValueError:
+        payload = {}
+    if not isinstance(payload, dict):
+        payload = {}
+    ip = req.headers.get('X-Forwarded-For') or req.headers.get('X-Client-IP') or 'unknown'
+    envelope = {
+        "t": round(started, 3),
+        "fn": function_name,
+        "m": req.method,
+        "r": req.route_params.get('subroute', ''),
+        "c": _client_id(ip),
+        "b": len(body),
+        "s": status_code,
+        "ms": round(elapsed * 1000, 1),
+    }
+    messages = payload.get('messages')
+    if isinstance(messages, list):
+        # Role initial and content length per message, e.g. roles "uau", lens [120, 640, 80]
+        envelope["roles"] = "".join(str(m.get('role', '?'))[:1] if isinstance(m, dict) else "?" for m in messages)
+        envelope["lens"] = [len(str(m.get('content', ''))) if isinstance(m, dict) else 0 for m in messages]
+    level = payload.get('assistanceLevel') or payload.get('type')
+    if isinstance(level, str):
+        envelope["lvl"] = level[:32]
+    tower_type = payload.get('towerType')
+    if isinstance(tower_type, str):
+        envelope["tower"] = tower_type[:32]
+    context = payload.get('context')
+    if isinstance(context, dict):
+        envelope["lang"] = str(context.get('language', ''))[:16]
+        envelope["code"] = len(str(context.get('code', '')))
+        tower_count = context.get('towerCount', 1)
+        envelope["n"] = tower_count if isinstance(tower_count, int) else 1
+    return envelope
+
+
+def append_envelope(envelope):
+    global _fd
+    line = (json.dumps(envelope, separators=(",", ":")) + "\n").encode("utf-8")
+    with _fd_lock:
+        if _fd is None:
+            _fd = os.open(CAPTURE_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    # A single O_APPEND write keeps lines whole across threads and worker processes
+    os.write(_fd, line)
+
+
+def read_envelopes(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def capture(function_name):
+    """Decorate an HTTP trigger's main() to record request envelopes when capture is enabled."""
+    def decorator(main):
+        if not CAPTURE_PATH:
+            return main
+        if len(CAPTURE_SALT) < MIN_SALT_LENGTH:
+            logging.warning(f"TRAFFIC_CAPTURE_SALT must be at least {MIN_SALT_LENGTH} characters; traffic capture is disabled")
+            return main
+
+        @functools.wraps(main)
+        def wrapper(req):
+            started = time.time()
+            start = time.perf_counter()
+            resp = main(req)
+            try:
+                append_envelope(build_envelope(function_name, req, resp.status_code, started, time.perf_counter() - start))
+            except Exception:
+                logging.warning("Failed to record traffic capture envelope", exc_info=True)
+            return resp
+        return wrapper
+    return decorator
@@ -0,0 +1,78 @@
+"""Benchmark the ExecuteTwoSumSolutionProxy sandbox pool.
+
+Reports executions per second and latency percentiles for uncached runs,
+plus the cached path, so we can check execution is fast enough to leave on.
+
+Usage: python benchmarks/bench_execute_two_sum.py [--requests 200] [--concurrency 4] [--pool-size 4]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions", "ExecuteTwoSumSolutionProxy"))
+
+import sandbox  # noqa: E402
+
+SOLUTION = """
+def two_sum(nums, target):
+    seen = {}
+    for i, n in enumerate(nums):
+        if target - n in seen:
+            return [seen[target - n], i]
+        seen[n] = i
+"""
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(pool, total, concurrency, use_cache):
+    latencies = []
+
+    def one(i):
+        # Vary the text so every uncached run really hits a worker
+        code = SOLUTION if use_cache else f"{SOLUTION}\n# submission {i}\n"
+        started = time.perf_counter()
+        outcome = pool.run(code, use_cache=use_cache)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert outcome["all_passed"], outcome
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+    return total / elapsed, latencies
+
+
+def report(label, rate, latencies):
+    print(f"{label}: {rate:.1f} exec/s, "
+          f"p50 {statistics.median(latencies):.2f}ms, "
+          f"p99 {percentile(latencies, 99):.2f}ms, "
+          f"max {max(latencies):.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=sandbox.POOL_SIZE)
+    args = parser.parse_args()
+
+    pool = sandbox.SandboxPool(size=args.pool_size)
+    try:
+        # Warm-up so start-up of the fork helper and its first workers is not counted
+        run(pool, args.pool_size, args.concurrency, use_cache=False)
+        report("uncached", *run(pool, args.requests, args.concurrency, use_cache=False))
+        report("cached", *run(pool, args.requests, args.concurrency, use_cache=True))
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
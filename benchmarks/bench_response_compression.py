@@ -0,0 +1,108 @@
+"""Benchmark NewMethodProxy response encoding: bytes on the wire and CPU cost.
+
+Compares the old json.dumps output with compact separators, the compact
+schema, and gzip/brotli at typical payload sizes (tower snippet, error,
+short chat, 800-token chat), plus per-frame compression of a streamed chat.
+
+Requires the function app requirements (azure-functions; Brotli optional).
+
+Usage: python benchmarks/bench_response_compression.py [--number 2000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions", "NewMethodProxy"))
+
+import responses  # noqa: E402
+
+SENTENCES = [
+    "Think about what information you need to remember as you walk through the array.",
+    "A hash map lets you look up a value you have already seen in constant time.",
+    "For each number, the complement is the target minus that number.",
+    "Before adding the current number, check whether its complement is already stored.",
+    "Sorting would change the indices, so consider whether you can avoid it.",
+    "Try tracing your loop by hand with the input [2, 7, 11, 15] and target 9.",
+    "What should happen when the same value appears twice, as in [3, 3]?",
+    "Your current approach compares every pair, which is O(n^2) time.",
+    "Can you trade some extra memory for a single pass over the input?",
+    "Remember that the problem guarantees exactly one valid answer.",
+    "Return the two indices, not the two values.",
+    "Edge cases like negative numbers and zero work the same way with this idea.",
+    "If you get stuck, write down what you know after visiting each element.",
+    "Think about which data structure gives fast membership checks.",
+]
+
+
+def chat_text(tokens, seed):
+    # Roughly four characters per token, built from distinct hint sentences
+    rng = random.Random(seed)
+    words = []
+    while len(" ".join(words)) < tokens * 4:
+        words.append(rng.choice(SENTENCES))
+    return " ".join(words)[:tokens * 4]
+
+
+PAYLOADS = {
+    "snippet": {"snippet": "for i in range(len(nums)):", "requests_remaining": 7, "reset_seconds": 143},
+    "error": {"error": "Message content too long"},
+    "chat-100": {"response": chat_text(100, 1), "requests_remaining": 7, "reset_seconds": 143},
+    "chat-800": {"response": chat_text(800, 2), "requests_remaining": 7, "reset_seconds": 143},
+}
+
+
+def measure(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def bench_bodies(number):
+    encodings = [None, "gzip"] + (["br"] if responses.brotli is not None else [])
+    print(f"{'payload':<10} {'variant':<34} {'bytes':>7} {'us/resp':>9}")
+    for name, payload in PAYLOADS.items():
+        baseline = json.dumps(payload).encode("utf-8")
+        print(f"{name:<10} {'json.dumps (before)':<34} {len(baseline):>7} "
+              f"{measure(lambda: json.dumps(payload).encode('utf-8'), number):>9.1f}")
+        for compact in (False, True):
+            for encoding in encodings:
+                response_format = responses.ResponseFormat(encoding, compact)
+                body, applied = responses.encode_body(payload, response_format)
+                label = f"{'compact schema' if compact else 'compact separators'} {encoding or 'identity'}"
+                if encoding and not applied:
+                    label += " (skip)"
+                print(f"{name:<10} {label:<34} {len(body):>7} "
+                      f"{measure(lambda: responses.encode_body(payload, response_format), number):>9.1f}")
+        print()
+
+
+def bench_stream(number, frame_chars):
+    # A streamed 800-token chat, one frame per frame_chars characters of text
+    text = chat_text(800, 2)
+    frames = [
+        json.dumps({"d": text[i:i + frame_chars]}, separators=(",", ":")).encode("utf-8") + b"\n"
+        for i in range(0, len(text), frame_chars)
+    ]
+    encodings = [None, "gzip"] + (["br"] if responses.brotli is not None else [])
+    print(f"streamed chat-800, {frame_chars} chars/frame: {len(frames)} frames")
+    for encoding in encodings:
+        total = sum(len(chunk) for chunk in responses.iter_compressed(frames, encoding))
+        cost = measure(lambda: list(responses.iter_compressed(frames, encoding)), max(1, number // 100))
+        print(f"  {encoding or 'identity':<10} {total:>7} bytes {cost:>9.1f} us/stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    print(f"threshold {responses.MIN_COMPRESS_BYTES} bytes, gzip level {responses.GZIP_LEVEL}, "
+          f"brotli quality {responses.BROTLI_QUALITY if responses.brotli is not None else 'unavailable'}\n")
+    bench_bodies(args.number)
+    # Per-token frames versus frames coalesced to roughly one sentence
+    for frame_chars in (4, 64, 256):
+        bench_stream(args.number, frame_chars)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Pre-generate the NewMethodProxy tower snippet index.
+
+Calls Azure OpenAI once per tower type x language x problem x code context x
+variant and writes the results to NewMethodProxy/snippet_index.sqlite, which
+ships with the function app. Variant N is generated for tower number N.
+
+Uses the same AZURE_OPENAI_* settings as the function app.
+
+Usage: python scripts/build_snippet_index.py [--variants 3] [--output PATH]
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+
+from openai import AzureOpenAI  # noqa: E402
+
+from NewMethodProxy import (  # noqa: E402
+    SYSTEM_PROMPTS, TOWER_TYPES, build_snippet_prompt, extract_single_line_of_code, get_problem_text
+)
+from NewMethodProxy import snippet_index  # noqa: E402
+
+# Problems used on the blog, with the starter code each language opens with.
+# An empty code context covers players who place a tower before typing anything.
+KNOWN_PROBLEMS = [
+    {
+        "title": "Two Sum",
+        "starter_code": {
+            "Python": "def two_sum(nums, target):\n    pass",
+            "JavaScript": "function twoSum(nums, target) {\n}",
+            "Java": "class Solution {\n    public int[] twoSum(int[] nums, int target) {\n    }\n}",
+        },
+    },
+]
+
+
+def build_jobs(variants):
+    jobs = []
+    for problem in KNOWN_PROBLEMS:
+        for language, starter_code in problem["starter_code"].items():
+            for code in ("", starter_code):
+                for tower_type in TOWER_TYPES:
+                    for variant in range(1, variants + 1):
+                        context = {
+                            "problem": {"title": problem["title"]},
+                            "language": language,
+                            "code": code,
+                            "towerCount": variant,
+                        }
+                        jobs.append((tower_type, context, variant))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", type=int, default=3)
+    parser.add_argument("--output", default=snippet_index.INDEX_PATH)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    client = AzureOpenAI(
+        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+        api_key=os.environ["AZURE_OPENAI_API_KEY"],
+        api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+    )
+    deployment = os.environ.get("AZURE_DEPLOYMENT_NAME", "gpt-4o")
+
+    def generate(job):
+        tower_type, context, variant = job
+        response = client.chat.completions.create(
+            model=deployment,
+            messages=[SYSTEM_PROMPTS["snippetGeneration"], {"role": "user", "content": build_snippet_prompt(tower_type, context)}],
+            max_tokens=800,
+            temperature=0.7,
+            top_p=0.95,
+            frequency_penalty=0,
+            presence_penalty=0
+        )
+        snippet = extract_single_line_of_code(response.choices[0].message.content)
+        return (tower_type, context["language"], get_problem_text(context), context["code"], variant, snippet)
+
+    jobs = build_jobs(args.variants)
+    logging.info(f"Generating {len(jobs)} snippets")
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        rows = list(executor.map(generate, jobs))
+    snippet_index.write_index(rows, args.output)
+    logging.info(f"Wrote {len(rows)} snippets to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
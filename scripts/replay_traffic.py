@@ -0,0 +1,227 @@
+"""Replay captured traffic against NewMethodProxy.main and OldMethodProxy.main.
+
+Reads a TRAFFIC_CAPTURE_PATH file, rebuilds requests of the same shape
+(route, message roles and sizes, tower type, code size, client) and issues
+them at the original inter-arrival times divided by --speed. Azure OpenAI
+and Table storage are replaced with local stand-ins, so no credentials or
+network are needed. Reports throughput and latency percentiles per route.
+
+Usage: python scripts/replay_traffic.py capture.jsonl [--speed 1] [--chat-latency-ms 1500]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+
+# Never record the replay itself
+os.environ.pop("TRAFFIC_CAPTURE_PATH", None)
+os.environ.setdefault("DEPLOYMENT_STORAGE_CONNECTION_STRING", "replay")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://replay.invalid")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "replay")
+
+import azure.functions as func  # noqa: E402
+
+import NewMethodProxy  # noqa: E402
+import OldMethodProxy  # noqa: E402
+from shared_code.traffic_capture import read_envelopes  # noqa: E402
+
+ROLES = {"u": "user", "a": "assistant", "s": "system"}
+HANDLERS = {"NewMethodProxy": NewMethodProxy, "OldMethodProxy": OldMethodProxy}
+
+
+class StandInTable:
+    """In-memory stand-in for the RateLimit table."""
+
+    def __init__(self):
+        self._entities = {}
+        self._lock = threading.Lock()
+
+    def get_entity(self, partition_key, row_key):
+        with self._lock:
+            return dict(self._entities[(partition_key, row_key)])
+
+    def update_entity(self, entity, mode=None):
+        self.upsert_entity(entity)
+
+    def upsert_entity(self, entity):
+        with self._lock:
+            self._entities[(entity["PartitionKey"], entity["RowKey"])] = dict(entity)
+
+
+class StandInTableService:
+    table = StandInTable()
+
+    @classmethod
+    def from_connection_string(cls, conn_str):
+        return cls()
+
+    def create_table(self, table_name):
+        pass
+
+    def get_table_client(self, table_name):
+        return self.table
+
+
+class StandInCompletions:
+    def __init__(self, latency):
+        self._latency = latency
+
+    def create(self, model, messages, max_tokens, **kwargs):
+        is_snippet = messages[0] in (NewMethodProxy.SYSTEM_PROMPTS["snippetGeneration"], OldMethodProxy.SYSTEM_PROMPTS["snippetGeneration"])
+        time.sleep(self._latency("snippet" if is_snippet else "chat"))
+        content = "for i in range(len(nums)):" if is_snippet else "Think about which values you have already seen. " * 40
+        message = type("Message", (), {"content": content})()
+        choice = type("Choice", (), {"message": message})()
+        return type("Completion", (), {"choices": [choice]})()
+
+
+def make_stand_in_openai(latency):
+    class StandInAzureOpenAI:
+        def __init__(self, **kwargs):
+            self.chat = type("Chat", (), {"completions": StandInCompletions(latency)})()
+    return StandInAzureOpenAI
+
+
+def build_request(envelope):
+    body = {}
+    if "lens" in envelope:
+        body["messages"] = [
+            {"role": ROLES.get(role, "user"), "content": "x" * length}
+            for role, length in zip(envelope.get("roles", ""), envelope["lens"])
+        ]
+    if "lvl" in envelope:
+        body["assistanceLevel" if envelope["fn"] == "NewMethodProxy" else "type"] = envelope["lvl"]
+    if "tower" in envelope:
+        body["towerType"] = envelope["tower"]
+    if "lang" in envelope:
+        body["context"] = {
+            "problem": {"title": "Replay"},
+            "language": envelope["lang"],
+            "code": "x" * envelope.get("code", 0),
+            "towerCount": envelope.get("n", 1),
+        }
+    raw = json.dumps(body).encode("utf-8") if envelope.get("b") else b""
+    client = int(envelope.get("c", "0"), 16)
+    ip = f"10.{(client >> 16) & 255}.{(client >> 8) & 255}.{client & 255}"
+    return func.HttpRequest(
+        method=envelope.get("m", "POST"),
+        url=f"/api/{envelope['fn']}/{envelope.get('r', '')}",
+        headers={"X-Forwarded-For": ip, "Content-Type": "application/json"},
+        route_params={"subroute": envelope.get("r", "")},
+        body=raw
+    )
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def describe(values):
+    return (f"p50 {statistics.median(values):8.1f}ms  p90 {percentile(values, 90):8.1f}ms  "
+            f"p99 {percentile(values, 99):8.1f}ms  max {max(values):8.1f}ms")
+
+
+def replay(envelopes, speed, threads):
+    results = []
+    results_lock = threading.Lock()
+
+    def issue(envelope, scheduled):
+        try:
+            req = build_request(envelope)
+            status = HANDLERS[envelope["fn"]].main(req).status_code
+        except Exception:
+            # Counted separately from HTTP statuses so handler crashes are not hidden
+            logging.exception("Handler raised while replaying %s/%s", envelope["fn"], envelope.get("r", ""))
+            status = "exception"
+        finished = time.perf_counter()
+        with results_lock:
+            results.append((envelope, status, (finished - scheduled) * 1000, finished))
+
+    first = envelopes[0]["t"]
+    start = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for envelope in envelopes:
+            scheduled = start + (envelope["t"] - first) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(issue, envelope, scheduled))
+        wait(futures)
+    for future in futures:
+        # issue() records handler errors itself; anything left here is a bug in the replay
+        future.result()
+    if not results:
+        return results, 0.0
+    elapsed = max(finished for _, _, _, finished in results) - start
+    return results, elapsed
+
+
+def report(results, elapsed):
+    if not results:
+        print("No requests completed")
+        return
+    print(f"replayed {len(results)} requests in {elapsed:.2f}s ({len(results) / max(elapsed, 1e-9):.1f} req/s)")
+    groups = defaultdict(list)
+    for envelope, status, latency, _ in results:
+        groups[(envelope["fn"], envelope.get("r", ""))].append((envelope, status, latency))
+    for (fn, route), rows in sorted(groups.items()):
+        statuses = defaultdict(int)
+        for _, status, _ in rows:
+            statuses[status] += 1
+        print(f"\n{fn}/{route or '-'}: {len(rows)} requests, status {dict(sorted(statuses.items(), key=lambda item: str(item[0])))}")
+        print(f"  replay   {describe([latency for _, _, latency in rows])}")
+        captured = [envelope["ms"] for envelope, _, _ in rows if "ms" in envelope]
+        if captured:
+            print(f"  captured {describe(captured)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", help="file written with TRAFFIC_CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="N replays N times faster than captured")
+    parser.add_argument("--threads", type=int, default=64, help="concurrent handler invocations")
+    parser.add_argument("--chat-latency-ms", type=float, default=1500)
+    parser.add_argument("--snippet-latency-ms", type=float, default=300)
+    parser.add_argument("--jitter", type=float, default=0.2, help="+/- fraction applied to model latency")
+    parser.add_argument("--no-rate-limit", action="store_true", help="disable the per-IP rate limit")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    rng = random.Random(args.seed)
+    rng_lock = threading.Lock()
+    base_latency = {"chat": args.chat_latency_ms / 1000, "snippet": args.snippet_latency_ms / 1000}
+
+    def latency(kind):
+        with rng_lock:
+            return base_latency[kind] * (1 + rng.uniform(-args.jitter, args.jitter))
+
+    for module in HANDLERS.values():
+        module.AzureOpenAI = make_stand_in_openai(latency)
+        module.TableServiceClient = StandInTableService
+        if args.no_rate_limit:
+            module.RATE_LIMIT = sys.maxsize
+
+    envelopes = sorted(
+        (envelope for envelope in read_envelopes(args.capture) if envelope.get("fn") in HANDLERS),
+        key=lambda envelope: envelope["t"]
+    )
+    if not envelopes:
+        sys.exit(f"No NewMethodProxy/OldMethodProxy requests in {args.capture}")
+    report(*replay(envelopes, args.speed, args.threads))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Isolation checks for the ExecuteTwoSumSolutionProxy sandbox.
+
+Usage: python -m pytest tests/
+"""
+import json
+import os
+import sys
+
+import pytest
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions")
+sys.path.insert(0, os.path.join(FUNCTIONS_DIR, "ExecuteTwoSumSolutionProxy"))
+
+import sandbox  # noqa: E402
+
+SOLUTION = """
+def two_sum(nums, target):
+    seen = {}
+    for i, n in enumerate(nums):
+        if target - n in seen:
+            return [seen[target - n], i]
+        seen[n] = i
+"""
+
+CPU_LOOP = """
+def two_sum(nums, target):
+    while True:
+        pass
+"""
+
+# Reaches os.open/os.read through a class the restricted builtins do not hide
+READ_FILE = """
+g = [c for c in ().__class__.__base__.__subclasses__() if c.__name__ == "_wrap_close"][0].__init__.__globals__
+try:
+    print("read", g["read"](g["open"](%r, 0), 100))
+except OSError:
+    print("refused")
+def two_sum(nums, target):
+    return [0, 1]
+"""
+
+
+def start_pool(**kwargs):
+    pool = sandbox.SandboxPool(size=1, **kwargs)
+    if pool.run(SOLUTION, use_cache=False)["unavailable"]:
+        pool.close()
+        pytest.skip("sandbox isolation is not supported on this host")
+    return pool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = start_pool()
+    yield pool
+    pool.close()
+
+
+def test_solution_passes(pool):
+    outcome = pool.run(SOLUTION, use_cache=False)
+    assert outcome["error"] is None
+    assert outcome["all_passed"]
+
+
+def test_file_read_is_refused(pool):
+    # World-readable on the host, so only the empty root filesystem keeps it out
+    outcome = pool.run(READ_FILE % "/etc/passwd", use_cache=False)
+    assert outcome["stdout"].strip() == "refused"
+
+
+def test_cpu_loop_hits_time_limit(pool):
+    outcome = pool.run(CPU_LOOP)
+    assert outcome["error"] == f"CPU time limit exceeded ({sandbox.CPU_SECONDS}s)"
+    assert not pool.run(CPU_LOOP)["cached"]
+
+
+def test_wall_timeout_is_not_cached():
+    pool = start_pool(wall_timeout=1)
+    try:
+        outcome = pool.run(CPU_LOOP)
+        assert outcome["error"].startswith("Time limit exceeded")
+        assert not pool.run(CPU_LOOP)["cached"]
+    finally:
+        pool.close()
+
+
+def test_cache_key_includes_test_cases(pool):
+    assert not pool.run(SOLUTION)["cached"]
+    assert pool.run(SOLUTION)["cached"]
+    assert not pool.run(SOLUTION, test_cases=sandbox.TWO_SUM_TEST_CASES[:2])["cached"]
+
+
+def test_isolation_failure_returns_503(monkeypatch):
+    pytest.importorskip("azure.functions")
+    pytest.importorskip("azure.data.tables")
+    import azure.functions as func
+    sys.path.insert(0, FUNCTIONS_DIR)
+    import ExecuteTwoSumSolutionProxy as handler
+
+    class UnavailablePool:
+        def run(self, code):
+            # Exactly what the host builds from a worker that could not isolate itself
+            body = json.dumps({"unavailable": True, "error": "isolation failed"}).encode("utf-8")
+            outcome, cacheable = sandbox._validate_outcome(sandbox.KIND_RESULT, body, sandbox.TWO_SUM_TEST_CASES)
+            assert not cacheable
+            return dict(outcome, all_passed=False, duration_ms=0, cached=False)
+
+    monkeypatch.setattr(handler, "is_rate_limited", lambda ip: (False, 9, 180))
+    monkeypatch.setattr(handler, "get_pool", UnavailablePool)
+    resp = handler.main(func.HttpRequest(
+        method="POST",
+        url="/api/ExecuteTwoSumSolutionProxy",
+        body=json.dumps({"code": SOLUTION}).encode("utf-8")
+    ))
+    assert resp.status_code == 503
+    assert json.loads(resp.get_body())["error"] == "Code execution is unavailable on this host."